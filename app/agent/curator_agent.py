@@ -1,13 +1,20 @@
-import os
 import re
-import json
+import time
+import functools
+from collections import namedtuple
+from operator import attrgetter
 from datetime import datetime, timezone
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, FrozenSet, Optional, Tuple
 
-from groq import Groq
+import groq
+import httpx
+import numpy as np
+import orjson
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
+from app.llm.groq_client import get_groq
+
 load_dotenv()
 
 
@@ -23,6 +30,11 @@ class RankedDigestList(BaseModel):
     articles: List[RankedArticle] = Field(description="List of ranked articles")
 
 
+# ---------- Internal scoring rows ----------
+PreRanked = namedtuple("PreRanked", ["score", "why", "digest"])
+Scored = namedtuple("Scored", ["digest_id", "score", "reasoning"])
+
+
 # ---------- Prompt (LLM should return SMALL JSON only) ----------
 LLM_SCORE_PROMPT = """You are an AI news curator.
 
@@ -45,34 +57,83 @@ IMPORTANT OUTPUT RULES:
 
 
 # ---------- Helper utils ----------
-def _now_utc() -> datetime:
-    return datetime.now(timezone.utc)
+_TOKEN_RE = re.compile(r"[a-z0-9]{4,}")
 
+# Errors that mean "no usable LLM scores" (JSON decode errors are ValueErrors).
+# Transport errors raised while iterating a streamed response are raw httpx
+# errors, not groq.APIError.
+LLM_ERRORS = (groq.APIError, httpx.HTTPError, ValueError, TimeoutError)
+RATE_LIMIT_RETRIES = 1
+RATE_LIMIT_BACKOFF_S = 5.0
 
-def _tokenize(text: str) -> List[str]:
-    # simple, fast tokenizer
-    text = (text or "").lower()
-    tokens = re.findall(r"[a-z0-9]{4,}", text)
-    return tokens
+# Groq Batch API polling
+BATCH_POLL_INTERVAL_S = 30
+BATCH_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
 
+# Pre-rank vocabulary tags (a token may carry several)
+INTEREST_BIT = 1
+BOOST_BIT = 2
+DOWN_BIT = 4
 
-def _extract_json(text: str) -> str:
-    text = (text or "").strip()
 
-    # remove code fences if model used them
-    if text.startswith("```"):
-        parts = text.split("```")
-        if len(parts) >= 2:
-            text = parts[1].strip()
-            text = re.sub(r"^\s*json\s*", "", text, flags=re.IGNORECASE).strip()
+def _now_utc() -> datetime:
+    return datetime.now(timezone.utc)
 
-    # extract outermost JSON object
-    start = text.find("{")
-    end = text.rfind("}")
-    if start == -1 or end == -1 or end <= start:
-        raise ValueError("No JSON object found in LLM response")
 
-    return text[start : end + 1]
+@functools.lru_cache(maxsize=4096)
+def _tokenize(text: str) -> Tuple[str, ...]:
+    # simple, fast tokenizer (pure, so results are memoized)
+    return tuple(_TOKEN_RE.findall(text.lower() if text else ""))
+
+
+@functools.lru_cache(maxsize=4096)
+def _digest_tokens(title: str, summary: str) -> FrozenSet[str]:
+    # distinct tokens of a digest; the same digest is re-scored across runs
+    return frozenset(_tokenize(f"{title} {summary}"))
+
+
+def tokenize_digest(title: str, summary: str) -> List[str]:
+    """Distinct pre-rank tokens for a digest, stored on the row at ingest."""
+    return sorted(_digest_tokens(title or "", summary or ""))
+
+
+class _JsonObjectScanner:
+    """Finds balanced top-level {...} objects in text that arrives in pieces."""
+
+    def __init__(self):
+        self._pending = ""
+        self._buf: List[str] = []
+        self._depth = 0
+        self._in_str = False
+        self._escaped = False
+
+    def feed(self, text: str) -> Optional[str]:
+        text = self._pending + text
+        for pos, ch in enumerate(text):
+            if self._depth == 0:
+                if ch != "{":
+                    continue  # text outside any object
+                self._buf = []
+            self._buf.append(ch)
+            if self._in_str:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_str = False
+            elif ch == '"':
+                self._in_str = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    # keep the rest for the next call in case this object is rejected
+                    self._pending = text[pos + 1:]
+                    return "".join(self._buf)
+        self._pending = ""
+        return None
 
 
 # ---------- The professional CuratorAgent ----------
@@ -84,158 +145,352 @@ class CuratorAgent:
       C) Fallback to heuristic ranking if LLM fails
     """
 
-    def __init__(self, user_profile: dict):
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+    def __init__(
+        self,
+        user_profile: dict,
+        use_batch: bool = False,
+        batch_timeout_s: float = 600.0,
+        stream_scores: bool = False,
+    ):
+        self.client = get_groq()
         self.model = "llama-3.1-8b-instant"
         self.user_profile = user_profile
 
+        # Profile is fixed for the agent's lifetime; an identical system
+        # prompt on every call also lets Groq reuse its prompt cache
+        self._system_prompt = f"""{LLM_SCORE_PROMPT}
+
+User Profile:
+Name: {user_profile.get("name")}
+Background: {user_profile.get("background")}
+Expertise Level: {user_profile.get("expertise_level")}
+Interests: {", ".join(user_profile.get("interests", []))}"""
+
+        # Batch API is cheaper but slow; live scoring is the fallback
+        self.use_batch = use_batch
+        self.batch_timeout_s = batch_timeout_s
+        # Stream live scoring so parsing starts as soon as the JSON closes
+        self.stream_scores = stream_scores
+
         # Build interest vocabulary once
         interests_text = " ".join(user_profile.get("interests", []))
-        self.interest_tokens = set(_tokenize(interests_text))
+        self.interest_tokens = frozenset(_tokenize(interests_text))
 
         # Optional preference boost words (tune anytime)
         prefs = user_profile.get("preferences", {}) or {}
-        self.boost_terms = set()
+        boost_terms = set()
         if prefs.get("prefer_system_design"):
-            self.boost_terms.update(["architecture", "pipeline", "scalability", "latency", "reliability"])
+            boost_terms.update(["architecture", "pipeline", "scalability", "latency", "reliability"])
         if prefs.get("prefer_implementation_details"):
-            self.boost_terms.update(["implementation", "benchmark", "evaluation", "metrics", "code"])
+            boost_terms.update(["implementation", "benchmark", "evaluation", "metrics", "code"])
         if prefs.get("prefer_production_realism"):
-            self.boost_terms.update(["production", "deployment", "monitoring", "incident", "cost"])
+            boost_terms.update(["production", "deployment", "monitoring", "incident", "cost"])
+        self.boost_terms = frozenset(boost_terms)
 
-        self.down_terms = set()
+        down_terms = set()
         if prefs.get("avoid_marketing_hype"):
-            self.down_terms.update(["webinar", "register", "limited", "launch", "partnership"])
+            down_terms.update(["webinar", "register", "limited", "launch", "partnership"])
+        self.down_terms = frozenset(down_terms)
+
+        # token -> tag bits (a term may be in several buckets)
+        self._vocab: Dict[str, int] = {}
+        for terms, bit in (
+            (self.interest_tokens, INTEREST_BIT),
+            (self.boost_terms, BOOST_BIT),
+            (self.down_terms, DOWN_BIT),
+        ):
+            for tok in terms:
+                self._vocab[tok] = self._vocab.get(tok, 0) | bit
+        # frozen key set: digest tokens are matched with one C-level intersection
+        self._vocab_terms = frozenset(self._vocab)
 
     # ---------- Stage A: deterministic pre-rank ----------
-    def _heuristic_score(self, d: Dict[str, Any]) -> Tuple[float, str]:
-        title = d.get("title", "") or ""
-        summary = d.get("summary", "") or ""
-        t = f"{title} {summary}"
-
-        toks = set(_tokenize(t))
-        interest_hits = len(toks & self.interest_tokens)
-        boost_hits = len(toks & self.boost_terms)
-        down_hits = len(toks & self.down_terms)
-
-        base = interest_hits * 1.2 + boost_hits * 0.8 - down_hits * 0.7
-
-        # recency boost if created_at exists
-        recency = 0.0
-        created_at = d.get("created_at")
+    def _age_hours(self, created_at: Any, now: datetime) -> float:
+        # NaN when created_at is missing/unusable -> no recency boost
         try:
             if isinstance(created_at, datetime):
-                age_h = max(0.0, (_now_utc() - created_at.astimezone(timezone.utc)).total_seconds() / 3600.0)
-                recency = max(0.0, 1.5 - (age_h / 24.0) * 1.5)
+                return max(0.0, (now - created_at.astimezone(timezone.utc)).total_seconds() / 3600.0)
         except Exception:
             pass
+        return np.nan
+
+    def _pre_rank(self, digests: List[dict], keep: int) -> List[PreRanked]:
+        """Return the top `keep` digests as (heuristic score, explanation, digest) rows.
+
+        Digests are passed through untouched rather than copied.
+        """
+        n = len(digests)
+        vocab = self._vocab
+        vocab_terms = self._vocab_terms
+
+        # flat (doc index, tag bits) pairs for every distinct vocabulary hit
+        hit_docs: List[int] = []
+        hit_bits: List[int] = []
+        for i, d in enumerate(digests):
+            # tokens stored at ingest are used as-is; older rows have none
+            toks = d.get("tokens") or _digest_tokens(d.get("title", "") or "", d.get("summary", "") or "")
+            # only the few vocabulary hits reach Python-level code
+            for tok in vocab_terms.intersection(toks):
+                hit_docs.append(i)
+                hit_bits.append(vocab[tok])
+
+        docs = np.array(hit_docs, dtype=np.intp)
+        bits = np.array(hit_bits, dtype=np.uint8)
+        interest_hits = np.bincount(docs, weights=(bits & INTEREST_BIT) != 0, minlength=n)
+        boost_hits = np.bincount(docs, weights=(bits & BOOST_BIT) != 0, minlength=n)
+        down_hits = np.bincount(docs, weights=(bits & DOWN_BIT) != 0, minlength=n)
 
-        score = base + recency
-        why = f"interest={interest_hits}, boost={boost_hits}, recency={recency:.2f}"
-        return score, why
+        # recency boost if created_at exists
+        now = _now_utc()
+        ages = np.array([self._age_hours(d.get("created_at"), now) for d in digests], dtype=np.float64)
+        recency = np.nan_to_num(np.maximum(0.0, 1.5 - (ages / 24.0) * 1.5), nan=0.0)
 
-    def _pre_rank(self, digests: List[dict], keep: int) -> List[dict]:
-        scored = []
-        for d in digests:
-            s, why = self._heuristic_score(d)
-            d2 = dict(d)
-            d2["_heur_score"] = s
-            d2["_heur_why"] = why
-            scored.append(d2)
+        scores = interest_hits * 1.2 + boost_hits * 0.8 - down_hits * 0.7 + recency
 
-        scored.sort(key=lambda x: x["_heur_score"], reverse=True)
-        return scored[:keep]
+        # stable descending sort keeps input order for ties
+        indices = np.argsort(-scores, kind="stable")[:keep]
+        return [
+            PreRanked(score, f"interest={int(interest_hits[i])}, boost={int(boost_hits[i])}, recency={recency[i]:.2f}", digests[i])
+            for i, score in zip(indices, scores[indices].tolist())
+        ]
 
     # ---------- Stage B: LLM scoring (small output) ----------
-    def _llm_score(self, shortlisted: List[dict]) -> Dict[str, float]:
+    def _format_digest(self, d: dict) -> str:
         # Keep prompt small: id/title/summary/type only
-        digest_list = "\n\n".join([
-            f"ID: {d['id']}\nTitle: {d['title']}\nSummary: {d['summary']}\nType: {d['article_type']}"
-            for d in shortlisted
-        ])
+        return f"ID: {d['id']}\nTitle: {d['title']}\nSummary: {d['summary']}\nType: {d['article_type']}"
 
-        profile = self.user_profile
-        system = f"""{LLM_SCORE_PROMPT}
+    def _parse_scores(self, content: str) -> Dict[str, float]:
+        data = orjson.loads(content or "")
+        if not isinstance(data, dict):
+            raise ValueError("LLM response is not a JSON object")
+        return self._collect_scores(data)
 
-User Profile:
-Name: {profile.get("name")}
-Background: {profile.get("background")}
-Expertise Level: {profile.get("expertise_level")}
-Interests: {", ".join(profile.get("interests", []))}"""
+    def _collect_scores(self, data: dict) -> Dict[str, float]:
+        # JSON mode guarantees valid JSON, not this shape
+        articles = data.get("articles", [])
+        if not isinstance(articles, list):
+            raise ValueError("LLM response 'articles' is not a list")
+
+        scores = {}
+        for item in articles:
+            if not isinstance(item, dict):
+                continue
+            did = item.get("digest_id")
+            sc = item.get("relevance_score")
+            if isinstance(did, str) and did and isinstance(sc, (int, float)) and not isinstance(sc, bool):
+                scores[did] = float(sc)
+        return scores
+
+    def _llm_score(self, shortlisted: List[dict]) -> Dict[str, float]:
+        digest_list = "\n\n".join([self._format_digest(d) for d in shortlisted])
 
         user_prompt = f"""Score these {len(shortlisted)} digests by relevance. Return JSON only.
 
 {digest_list}
 """
 
-        resp = self.client.chat.completions.create(
-            model=self.model,
-            temperature=0.2,
-            max_tokens=450,  # small JSON output only
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user_prompt},
-            ],
+        messages = [
+            {"role": "system", "content": self._system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+        if self.stream_scores:
+            return self._stream_scores(messages)
+
+        resp = self._create_completion(
+            messages,
+            response_format={"type": "json_object"},  # well-formed JSON, no code fences
+            stream=False,
+        )
+        return self._parse_scores(resp.choices[0].message.content)
+
+    def _create_completion(self, messages: List[dict], **kwargs):
+        # the SDK retries 429s briefly; free-tier RPM windows need a longer wait
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            try:
+                return self.client.chat.completions.create(
+                    model=self.model,
+                    temperature=0.2,
+                    max_tokens=450,  # small JSON output only
+                    messages=messages,
+                    **kwargs,
+                )
+            except groq.RateLimitError:
+                if attempt == RATE_LIMIT_RETRIES:
+                    raise
+                time.sleep(RATE_LIMIT_BACKOFF_S * 2 ** attempt)
+
+    def _stream_scores(self, messages: List[dict]) -> Dict[str, float]:
+        """Stream the completion and parse as soon as a balanced JSON object arrives.
+
+        Streamed calls do not request JSON mode, so this relies on the prompt's
+        JSON-only instruction and ignores any text around the object.
+        """
+        stream = self._create_completion(messages, stream=True)
+        scanner = _JsonObjectScanner()
+        try:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                obj = scanner.feed(chunk.choices[0].delta.content or "")
+                while obj is not None:
+                    try:
+                        data = orjson.loads(obj)
+                    except orjson.JSONDecodeError:
+                        data = None
+                    if isinstance(data, dict) and "articles" in data:
+                        return self._collect_scores(data)
+                    # not the payload (e.g. an example object); keep scanning
+                    obj = scanner.feed("")
+        finally:
+            stream.close()  # stop reading once the object is parsed
+        raise ValueError("No JSON object found in streamed LLM response")
+
+    def _batch_score(self, shortlisted: List[dict]) -> Dict[str, float]:
+        """Score each digest as its own request through the Groq Batch API.
+
+        Raises TimeoutError if the batch does not finish within
+        `batch_timeout_s`, and RuntimeError if it fails or yields no usable
+        scores. If polling is interrupted for any reason the job is cancelled.
+        """
+        lines = []
+        for d in shortlisted:
+            lines.append(orjson.dumps({
+                "custom_id": d["id"],
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model,
+                    "temperature": 0.2,
+                    "max_tokens": 60,  # one {"digest_id", "relevance_score"} row
+                    "response_format": {"type": "json_object"},
+                    "messages": [
+                        {"role": "system", "content": self._system_prompt},
+                        {"role": "user", "content": f"Score this digest by relevance. Return JSON only.\n\n{self._format_digest(d)}\n"},
+                    ],
+                },
+            }))
+
+        input_file = self.client.files.create(
+            file=("curator_scores.jsonl", b"\n".join(lines)),
+            purpose="batch",
+        )
+        batch = self.client.batches.create(
+            completion_window="24h",
+            endpoint="/v1/chat/completions",
+            input_file_id=input_file.id,
         )
 
-        text = (resp.choices[0].message.content or "").strip()
-        json_text = _extract_json(text)
-        data = json.loads(json_text)
+        deadline = time.monotonic() + self.batch_timeout_s
+        try:
+            while batch.status not in BATCH_TERMINAL_STATUSES:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Groq batch {batch.id} not done after {self.batch_timeout_s}s")
+                time.sleep(min(BATCH_POLL_INTERVAL_S, max(0.0, deadline - time.monotonic())))
+                batch = self.client.batches.retrieve(batch.id)
+        except BaseException:
+            # the caller falls back to live scoring; don't pay for the same shortlist twice
+            try:
+                self.client.batches.cancel(batch.id)
+            except Exception as e:
+                print(f"Could not cancel Groq batch {batch.id}: {e}")
+            raise
+
+        if batch.status != "completed" or not batch.output_file_id:
+            raise RuntimeError(f"Groq batch {batch.id} ended with status {batch.status}")
 
         scores = {}
-        for item in data.get("articles", []):
-            did = item.get("digest_id")
-            sc = item.get("relevance_score")
-            if did and isinstance(sc, (int, float)):
+        output = self.client.files.content(batch.output_file_id).read()
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            # a bad row only loses its own score (heuristic fallback), not the batch
+            try:
+                row = orjson.loads(line)
+                response = row.get("response") or {}
+                if response.get("status_code") != 200:
+                    continue
+                content = response["body"]["choices"][0]["message"]["content"]
+                articles = orjson.loads(content or "")["articles"]
+                sc = articles[0]["relevance_score"]
+            except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+                continue
+            # each request scores exactly one digest; custom_id is authoritative,
+            # whatever id the model echoed back
+            did = row.get("custom_id")
+            if isinstance(did, str) and did and isinstance(sc, (int, float)) and not isinstance(sc, bool):
                 scores[did] = float(sc)
+        if not scores:
+            raise RuntimeError(f"Groq batch {batch.id} returned no usable scores")
         return scores
 
+    def _score_shortlist(self, shortlisted: List[dict]) -> Dict[str, float]:
+        if self.use_batch:
+            try:
+                return self._batch_score(shortlisted)
+            except Exception as e:
+                print(f"Groq batch scoring failed, falling back to live scoring: {e}")
+        return self._llm_score(shortlisted)
+
     # ---------- Public method used by your pipeline ----------
     def rank_digests(self, digests: List[dict]) -> List[RankedArticle]:
         if not digests:
             return []
 
-        # 1) Pre-rank in Python (stable)
+        # 1) Pre-rank in Python (stable); nothing to cut if everything fits
         PRE_RANK_KEEP = 25  # safe for free tier
-        shortlisted = self._pre_rank(digests, keep=min(PRE_RANK_KEEP, len(digests)))
+        pre_rank_skipped = len(digests) <= PRE_RANK_KEEP
+        if pre_rank_skipped:
+            pre_ranked = None
+            shortlisted = digests
+        else:
+            pre_ranked = self._pre_rank(digests, keep=PRE_RANK_KEEP)
+            shortlisted = [row.digest for row in pre_ranked]
 
         # 2) LLM scores only shortlisted items
         try:
-            llm_scores = self._llm_score(shortlisted)
+            llm_scores = self._score_shortlist(shortlisted)
+        except LLM_ERRORS as e:
+            # 3) Fallback: purely heuristic ranking (pipeline never breaks)
+            print(f"LLM ranking failed, falling back to heuristic ranking: {e}")
+            llm_scores = None
 
+        if pre_ranked is None:
+            if llm_scores is not None and all(d["id"] in llm_scores for d in shortlisted):
+                # every item has an LLM score, so heuristics are never read
+                pre_ranked = [PreRanked(0.0, "pre-rank skipped", d) for d in shortlisted]
+            else:
+                pre_ranked = self._pre_rank(shortlisted, keep=len(shortlisted))
+
+        final_rows = []
+        if llm_scores is not None:
             # merge: if LLM missed any id, fallback to heuristic score mapping
             # normalize heuristic to 0..10 approx
-            final_rows = []
-            for d in shortlisted:
-                did = d["id"]
+            for row in pre_ranked:
+                did = row.digest["id"]
                 if did in llm_scores:
                     score = max(0.0, min(10.0, llm_scores[did]))
-                    reasoning = "LLM relevance score (shortlisted after heuristic pre-rank)"
+                    reasoning = (
+                        "LLM relevance score"
+                        if pre_rank_skipped
+                        else "LLM relevance score (shortlisted after heuristic pre-rank)"
+                    )
                 else:
                     # fallback for missing id
-                    score = max(0.0, min(10.0, 3.0 + min(7.0, d["_heur_score"])))
-                    reasoning = f"Fallback heuristic (LLM did not return score): {d['_heur_why']}"
-
-                final_rows.append((did, score, reasoning))
+                    score = max(0.0, min(10.0, 3.0 + min(7.0, row.score)))
+                    reasoning = f"Fallback heuristic (LLM did not return score): {row.why}"
 
-        except Exception as e:
-            # 3) Fallback: purely heuristic ranking (pipeline never breaks)
-            print(f"LLM ranking failed, falling back to heuristic ranking: {e}")
-            final_rows = []
-            for d in shortlisted:
-                score = max(0.0, min(10.0, 3.0 + min(7.0, d["_heur_score"])))
-                final_rows.append((d["id"], score, f"Heuristic ranking (no LLM): {d['_heur_why']}"))
+                final_rows.append(Scored(did, score, reasoning))
+        else:
+            for row in pre_ranked:
+                score = max(0.0, min(10.0, 3.0 + min(7.0, row.score)))
+                final_rows.append(Scored(row.digest["id"], score, f"Heuristic ranking (no LLM): {row.why}"))
 
         # 4) Sort and assign rank in Python (deterministic)
-        final_rows.sort(key=lambda x: x[1], reverse=True)
-
-        ranked: List[RankedArticle] = []
-        for idx, (digest_id, score, reasoning) in enumerate(final_rows, start=1):
-            ranked.append(RankedArticle(
-                digest_id=digest_id,
-                relevance_score=score,
-                rank=idx,
-                reasoning=reasoning
-            ))
-
-        return ranked
\ No newline at end of file
+        final_rows.sort(key=attrgetter("score"), reverse=True)
+
+        # validate all rows in one pydantic-core call
+        rows = [
+            {"digest_id": row.digest_id, "relevance_score": row.score, "rank": idx, "reasoning": row.reasoning}
+            for idx, row in enumerate(final_rows, start=1)
+        ]
+        return RankedDigestList.model_validate({"articles": rows}).articles
\ No newline at end of file
@@ -1,11 +1,14 @@
-import os
-import json
-from typing import Optional
-from groq import Groq
+import hashlib
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List, Optional, Tuple
+import groq
+import tiktoken
 from pydantic import BaseModel
-from dotenv import load_dotenv
 
-load_dotenv()
+from app.llm.groq_client import get_groq
 
 
 class DigestOutput(BaseModel):
@@ -13,6 +16,16 @@ class DigestOutput(BaseModel):
     summary: str
 
 
+class BatchDigestItem(BaseModel):
+    id: int
+    title: str
+    summary: str
+
+
+class BatchDigestOutput(BaseModel):
+    digests: List[BatchDigestItem]
+
+
 PROMPT = """You are an expert AI news analyst specializing in summarizing technical articles, research papers, and video content about artificial intelligence.
 
 Guidelines:
@@ -23,27 +36,250 @@ Guidelines:
 Return ONLY valid JSON: {"title":"...","summary":"..."}"""
 
 
+BATCH_PROMPT = """You are an expert AI news analyst specializing in summarizing technical articles, research papers, and video content about artificial intelligence.
+
+You will receive several numbered items. Create one digest for EACH item.
+
+Guidelines:
+- Create a compelling title (5-10 words)
+- Write a 2-3 sentence summary with key points + why it matters
+- Avoid marketing fluff
+- Keep each digest independent; never mix content between items
+
+Return ONLY valid JSON: {"digests":[{"id":1,"title":"...","summary":"..."},...]}"""
+
+
+MODEL = "llama-3.1-8b-instant"
+
+# Larger batches degrade per-item quality on 8B models
+MAX_BATCH_SIZE = 8
+# Groq bills and rate-limits by tokens, so truncate by tokens too
+MAX_CONTENT_TOKENS = 2500
+MAX_CONTENT_CHARS = 8000  # only used if the tokenizer cannot be loaded
+CHARS_PER_TOKEN = 4  # rough English average, for counting without the tokenizer
+# Content tokens per batched request. Free-tier 8B models allow 6000 tokens/minute
+# and reject any single request above that, so long items get smaller batches.
+MAX_BATCH_TOKENS = 4000
+
+# Groq free tier: 30 requests/minute and 6000 tokens/minute
+MAX_WORKERS = 8
+REQUESTS_PER_MINUTE = 30
+TOKENS_PER_MINUTE = 6000
+# Charged against TOKENS_PER_MINUTE on top of the content tokens
+REQUEST_OVERHEAD_TOKENS = 200  # system prompt and item headers
+OUTPUT_TOKENS_PER_DIGEST = 150
+# The SDK retries 429s briefly; wait out the one-minute window instead
+RATE_LIMIT_RETRIES = 1
+RATE_LIMIT_BACKOFF_S = 60.0
+
+# (title, content, article_type)
+DigestInput = Tuple[str, str, str]
+# An input with its content already truncated; `tokens` is the content's token count
+Prepared = namedtuple("Prepared", ["title", "content", "article_type", "tokens"])
+
+
+def digest_cache_key(title: str, content: str, article_type: str, model: str = MODEL) -> str:
+    # Identical inputs produce identical digests at temperature 0. Both prompts
+    # and the truncation limit are part of the key, so editing any of them
+    # invalidates old entries.
+    h = hashlib.blake2b(digest_size=16)
+    for part in (model, PROMPT, BATCH_PROMPT, str(MAX_CONTENT_TOKENS), article_type, title, content):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+# Loaded once per process; tiktoken downloads the BPE file on first use
+_encoding: Optional[tiktoken.Encoding] = None
+_encoding_lock = threading.Lock()
+
+
+def get_encoding() -> Optional[tiktoken.Encoding]:
+    global _encoding
+    # The lock keeps concurrent first calls to a single download. A failed
+    # load is not cached, so a transient network error is retried next run.
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                print(f"Could not load tokenizer, truncating by characters: {e}")
+        return _encoding
+
+
+def _prepare(item: DigestInput, enc: Optional[tiktoken.Encoding]) -> Prepared:
+    # Encode once: the same count truncates the content and sizes its batch
+    title, content, article_type = item
+    if enc is None:
+        content = content[:MAX_CONTENT_CHARS]
+        return Prepared(title, content, article_type, len(content) // CHARS_PER_TOKEN)
+    tokens = enc.encode(content, disallowed_special=())
+    if len(tokens) > MAX_CONTENT_TOKENS:
+        tokens = tokens[:MAX_CONTENT_TOKENS]
+        content = enc.decode(tokens)
+    return Prepared(title, content, article_type, len(tokens))
+
+
+def _pack_batches(prepared: List[Prepared]) -> List[Tuple[int, List[Prepared]]]:
+    """Split into consecutive `(start, batch)` runs capped by MAX_BATCH_SIZE and MAX_BATCH_TOKENS."""
+    batches = []
+    start = used = 0
+    for idx, item in enumerate(prepared):
+        if idx > start and (idx - start == MAX_BATCH_SIZE or used + item.tokens > MAX_BATCH_TOKENS):
+            batches.append((start, prepared[start:idx]))
+            start, used = idx, 0
+        used += item.tokens
+    if start < len(prepared):
+        batches.append((start, prepared[start:]))
+    return batches
+
+
+class RateLimiter:
+    """Thread-safe sliding-window limiter: at most `max_calls` calls and
+    `max_tokens` tokens per `period` seconds."""
+
+    def __init__(self, max_calls: int, max_tokens: int, period: float):
+        self.max_calls = max_calls
+        self.max_tokens = max_tokens
+        self.period = period
+        self._calls = deque()  # (timestamp, tokens)
+        self._tokens = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 0) -> None:
+        # A request above the whole budget can only run in an empty window
+        tokens = min(tokens, self.max_tokens)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0][0] >= self.period:
+                    self._tokens -= self._calls.popleft()[1]
+                if len(self._calls) < self.max_calls and self._tokens + tokens <= self.max_tokens:
+                    self._calls.append((now, tokens))
+                    self._tokens += tokens
+                    return
+                wait = self.period - (now - self._calls[0][0])
+            time.sleep(wait)
+
+
+# Shared by every DigestAgent so worker threads respect a single rate limit
+_rate_limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE, 60.0)
+
+
 class DigestAgent:
     def __init__(self):
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        self.model = "llama-3.1-8b-instant"
+        self.client = get_groq()
+        self.model = MODEL
+
+    def _complete(self, system_prompt: str, user_prompt: str, tokens: int):
+        # `tokens` is the request's estimated charge against TOKENS_PER_MINUTE
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            _rate_limiter.acquire(tokens)
+            try:
+                return self.client.chat.completions.create(
+                    model=self.model,
+                    temperature=0,  # deterministic, so outputs can be cached by input hash
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt},
+                    ],
+                )
+            except groq.RateLimitError:
+                if attempt == RATE_LIMIT_RETRIES:
+                    raise
+                time.sleep(RATE_LIMIT_BACKOFF_S)
 
     def generate_digest(self, title: str, content: str, article_type: str) -> Optional[DigestOutput]:
+        return self._digest_one(_prepare((title, content, article_type), get_encoding()))
+
+    def _digest_one(self, item: Prepared) -> Optional[DigestOutput]:
         try:
-            user_prompt = f"Create a digest for this {article_type}.\nTitle: {title}\nContent:\n{content[:8000]}"
+            user_prompt = f"Create a digest for this {item.article_type}.\nTitle: {item.title}\nContent:\n{item.content}"
 
-            resp = self.client.chat.completions.create(
-                model=self.model,
-                temperature=0.7,
-                messages=[
-                    {"role": "system", "content": PROMPT},
-                    {"role": "user", "content": user_prompt},
-                ],
-            )
+            tokens = item.tokens + REQUEST_OVERHEAD_TOKENS + OUTPUT_TOKENS_PER_DIGEST
+            resp = self._complete(PROMPT, user_prompt, tokens)
 
             text = (resp.choices[0].message.content or "").strip()
             return DigestOutput.model_validate_json(text)
 
         except Exception as e:
             print(f"Error generating digest (Groq): {e}")
-            return None
\ No newline at end of file
+            return None
+
+    def generate_digests(self, batch: List[DigestInput]) -> List[Optional[DigestOutput]]:
+        """Digest up to MAX_BATCH_SIZE items with a single Groq call.
+
+        Results are returned in input order. If the batched response cannot be
+        validated, or the request is too large for the token rate limit, every
+        item is retried with `generate_digest`. Use `generate_many` to also cap
+        batches by MAX_BATCH_TOKENS.
+        """
+        if len(batch) > MAX_BATCH_SIZE:
+            raise ValueError(f"Batch size {len(batch)} exceeds MAX_BATCH_SIZE={MAX_BATCH_SIZE}")
+        enc = get_encoding()
+        return self._digest_batch([_prepare(item, enc) for item in batch])
+
+    def _digest_batch(self, batch: List[Prepared]) -> List[Optional[DigestOutput]]:
+        if not batch:
+            return []
+        if len(batch) == 1:
+            return [self._digest_one(batch[0])]
+
+        items = "\n\n".join(
+            f"### Item {idx}\nType: {item.article_type}\nTitle: {item.title}\nContent:\n{item.content}"
+            for idx, item in enumerate(batch, start=1)
+        )
+        user_prompt = f"Create a digest for each of these {len(batch)} items.\n\n{items}"
+
+        try:
+            tokens = sum(item.tokens for item in batch) + REQUEST_OVERHEAD_TOKENS + OUTPUT_TOKENS_PER_DIGEST * len(batch)
+            resp = self._complete(BATCH_PROMPT, user_prompt, tokens)
+
+            text = (resp.choices[0].message.content or "").strip()
+            parsed = BatchDigestOutput.model_validate_json(text)
+
+            by_id = {d.id: d for d in parsed.digests}
+            if set(by_id) != set(range(1, len(batch) + 1)):
+                raise ValueError(f"Expected ids 1..{len(batch)}, got {sorted(by_id)}")
+
+            return [
+                DigestOutput(title=by_id[idx].title, summary=by_id[idx].summary)
+                for idx in range(1, len(batch) + 1)
+            ]
+
+        except ValueError as e:
+            # pydantic's ValidationError is a ValueError
+            print(f"Batched digest response invalid, retrying per item (Groq): {e}")
+        except groq.APIStatusError as e:
+            # 413/429: the combined request exceeds the token limit, but each item fits alone
+            if e.status_code not in (413, 429):
+                print(f"Error generating batched digests (Groq): {e}")
+                return [None] * len(batch)
+            print(f"Batched digest request too large ({e.status_code}), retrying per item (Groq)")
+        except Exception as e:
+            print(f"Error generating batched digests (Groq): {e}")
+            return [None] * len(batch)
+
+        return [self._digest_one(item) for item in batch]
+
+    def generate_many(
+        self, items: List[DigestInput], max_workers: int = MAX_WORKERS
+    ) -> Iterator[Tuple[int, List[Optional[DigestOutput]]]]:
+        """Digest any number of items, running batched Groq calls concurrently.
+
+        Batches hold at most MAX_BATCH_SIZE items and MAX_BATCH_TOKENS content
+        tokens, and calls are throttled to REQUESTS_PER_MINUTE and
+        TOKENS_PER_MINUTE across all threads. Yields `(start, results)` as each
+        batch finishes, where `results[i]` belongs to `items[start + i]`, so
+        callers can persist progress incrementally.
+        """
+        # resolved before the pool starts, and once per call rather than per item
+        enc = get_encoding()
+        batches = _pack_batches([_prepare(item, enc) for item in items])
+        if not batches:
+            return
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as pool:
+            futures = {pool.submit(self._digest_batch, batch): start for start, batch in batches}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
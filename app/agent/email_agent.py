@@ -1,10 +1,10 @@
-import os
 from datetime import datetime
 from typing import List, Optional
-from groq import Groq
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
+from app.llm.groq_client import get_groq
+
 load_dotenv()
 
 
@@ -66,7 +66,7 @@ Return ONLY valid JSON in this exact format:
 
 class EmailAgent:
     def __init__(self, user_profile: dict):
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+        self.client = get_groq()
         self.model = "llama-3.1-8b-instant"
         self.user_profile = user_profile
 
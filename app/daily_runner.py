@@ -4,6 +4,7 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+from app.database.create_tables import ensure_schema
 from app.runner import run_scrapers
 from app.services.process_anthropic import process_anthropic_markdown
 from app.services.process_youtube import process_youtube_transcripts
@@ -34,6 +35,9 @@ def run_daily_pipeline(hours: int = 2400, top_n: int = 10) -> dict:
     }
     
     try:
+        # Create missing tables/columns before any query touches them
+        ensure_schema()
+        
         logger.info("\n[1/5] Scraping articles from sources...")
         scraping_results = run_scrapers(hours=hours)
         results["scraping"] = {
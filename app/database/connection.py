@@ -20,7 +20,16 @@ def get_database_url() -> str:
 
     return f"postgresql://{user}:{password}@{host}:{port}/{db}"
 
-engine = create_engine(get_database_url(), pool_pre_ping=True)
+# Sized for scrapers/services running concurrently in threads
+engine = create_engine(
+    get_database_url(),
+    pool_pre_ping=True,
+    pool_size=20,
+    max_overflow=10,
+    pool_recycle=1800,  # drop connections before managed Postgres idles them out
+    pool_timeout=5,     # fail fast instead of queueing behind a starved pool
+    connect_args={"options": "-c statement_timeout=30000"},  # 30s per statement
+)
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -3,9 +3,20 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
+from sqlalchemy import text
+
 from app.database.models import Base
 from app.database.connection import engine
 
-if __name__ == "__main__":
+
+def ensure_schema() -> None:
+    # Idempotent: safe to run at the start of every pipeline run
     Base.metadata.create_all(engine)
+    # create_all does not alter existing tables; add columns introduced later
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE digests ADD COLUMN IF NOT EXISTS tokens TEXT[]"))
+
+
+if __name__ == "__main__":
+    ensure_schema()
     print("Tables created successfully")
@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Optional
 from sqlalchemy import Column, String, DateTime, Text
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -53,4 +54,14 @@ class Digest(Base):
     url = Column(String, nullable=False)
     title = Column(String, nullable=False)
     summary = Column(Text, nullable=False)
+    tokens = Column(ARRAY(Text), nullable=True)  # pre-rank tokens, computed at ingest
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DigestCache(Base):
+    __tablename__ = "digest_cache"
+    
+    key = Column(String, primary_key=True)
+    title = Column(String, nullable=False)
+    summary = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta, timezone
 from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
-from .models import YouTubeVideo, OpenAIArticle, AnthropicArticle, Digest
+from .models import YouTubeVideo, OpenAIArticle, AnthropicArticle, Digest, DigestCache
 from .connection import get_session
 
 
@@ -201,7 +201,7 @@ class Repository:
         
         return articles
     
-    def create_digest(self, article_type: str, article_id: str, url: str, title: str, summary: str, published_at: Optional[datetime] = None) -> Optional[Digest]:
+    def create_digest(self, article_type: str, article_id: str, url: str, title: str, summary: str, published_at: Optional[datetime] = None, tokens: Optional[List[str]] = None) -> Optional[Digest]:
         digest_id = f"{article_type}:{article_id}"
         existing = self.session.query(Digest).filter_by(id=digest_id).first()
         if existing:
@@ -221,6 +221,7 @@ class Repository:
             url=url,
             title=title,
             summary=summary,
+            tokens=tokens,
             created_at=created_at
         )
         self.session.add(digest)
@@ -241,7 +242,23 @@ class Repository:
                 "url": d.url,
                 "title": d.title,
                 "summary": d.summary,
+                "tokens": d.tokens,
                 "created_at": d.created_at
             }
             for d in digests
-        ]
\ No newline at end of file
+        ]
+    
+    def get_cached_digests(self, keys: List[str]) -> Dict[str, Dict[str, str]]:
+        if not keys:
+            return {}
+        rows = self.session.query(DigestCache).filter(DigestCache.key.in_(keys)).all()
+        return {row.key: {"title": row.title, "summary": row.summary} for row in rows}
+    
+    def cache_digest(self, key: str, title: str, summary: str) -> Optional[DigestCache]:
+        existing = self.session.query(DigestCache).filter_by(key=key).first()
+        if existing:
+            return None
+        entry = DigestCache(key=key, title=title, summary=summary)
+        self.session.add(entry)
+        self.session.commit()
+        return entry
@@ -0,0 +1,20 @@
+import os
+import threading
+from typing import Optional
+
+from groq import Groq
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# One client per process: agents share its httpx pool (TCP/TLS keep-alive)
+_client: Optional[Groq] = None
+_client_lock = threading.Lock()
+
+
+def get_groq() -> Groq:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+        return _client
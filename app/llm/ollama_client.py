@@ -1,10 +1,34 @@
-import requests
+import json
+from typing import Iterator
+
+import httpx
+
+# Module-level client keeps the localhost connection alive between calls
+_CLIENT = httpx.Client(base_url="http://localhost:11434", timeout=120)
+
 
 def ollama_generate(prompt: str, model: str = "llama3.1:8b") -> str:
-    r = requests.post(
-        "http://localhost:11434/api/generate",
+    r = _CLIENT.post(
+        "/api/generate",
         json={"model": model, "prompt": prompt, "stream": False},
-        timeout=120,
     )
     r.raise_for_status()
-    return r.json().get("response", "")
\ No newline at end of file
+    return r.json().get("response", "")
+
+
+def ollama_generate_stream(prompt: str, model: str = "llama3.1:8b") -> Iterator[str]:
+    # Ollama streams one JSON object per line; yield text as it arrives
+    with _CLIENT.stream(
+        "POST",
+        "/api/generate",
+        json={"model": model, "prompt": prompt, "stream": True},
+    ) as r:
+        r.raise_for_status()
+        for line in r.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get("response"):
+                yield chunk["response"]
+            if chunk.get("done"):
+                break
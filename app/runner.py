@@ -1,4 +1,5 @@
-from typing import List
+import asyncio
+from typing import List, Tuple
 from .config import YOUTUBE_CHANNELS
 from .scrapers.youtube import YouTubeScraper, ChannelVideo
 from .scrapers.openai import OpenAIScraper, OpenAIArticle
@@ -6,16 +7,39 @@ from .scrapers.anthropic import AnthropicScraper, AnthropicArticle
 from .database.repository import Repository
 
 
+async def scrape_sources(
+    youtube_scraper: YouTubeScraper,
+    openai_scraper: OpenAIScraper,
+    anthropic_scraper: AnthropicScraper,
+    hours: int = 24,
+) -> Tuple[List[List[ChannelVideo]], List[OpenAIArticle], List[AnthropicArticle]]:
+    # Feeds are independent network fetches: run them concurrently in worker
+    # threads so wall time is the slowest source, not the sum of all of them.
+    youtube_tasks = [
+        asyncio.to_thread(youtube_scraper.get_latest_videos, channel_id, hours=hours)
+        for channel_id in YOUTUBE_CHANNELS
+    ]
+    *channel_videos, openai_articles, anthropic_articles = await asyncio.gather(
+        *youtube_tasks,
+        asyncio.to_thread(openai_scraper.get_articles, hours=hours),
+        asyncio.to_thread(anthropic_scraper.get_articles, hours=hours),
+    )
+    return channel_videos, openai_articles, anthropic_articles
+
+
 def run_scrapers(hours: int = 24) -> dict:
     youtube_scraper = YouTubeScraper()
     openai_scraper = OpenAIScraper()
     anthropic_scraper = AnthropicScraper()
     repo = Repository()
     
+    channel_videos, openai_articles, anthropic_articles = asyncio.run(
+        scrape_sources(youtube_scraper, openai_scraper, anthropic_scraper, hours=hours)
+    )
+    
     youtube_videos = []
     video_dicts = []
-    for channel_id in YOUTUBE_CHANNELS:
-        videos = youtube_scraper.get_latest_videos(channel_id, hours=hours)
+    for channel_id, videos in zip(YOUTUBE_CHANNELS, channel_videos):
         youtube_videos.extend(videos)
         video_dicts.extend([
             {
@@ -30,9 +54,6 @@ def run_scrapers(hours: int = 24) -> dict:
             for v in videos
         ])
     
-    openai_articles = openai_scraper.get_articles(hours=hours)
-    anthropic_articles = anthropic_scraper.get_articles(hours=hours)
-    
     if video_dicts:
         repo.bulk_create_youtube_videos(video_dicts)
     
@@ -19,8 +19,8 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def curate_digests(hours: int = 24) -> dict:
-    curator = CuratorAgent(USER_PROFILE)
+def curate_digests(hours: int = 24, use_batch: bool = False, stream_scores: bool = False) -> dict:
+    curator = CuratorAgent(USER_PROFILE, use_batch=use_batch, stream_scores=stream_scores)
     repo = Repository()
     
     digests = repo.get_recent_digests(hours=hours)
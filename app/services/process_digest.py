@@ -5,7 +5,8 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from app.agent.digest_agent import DigestAgent
+from app.agent.curator_agent import tokenize_digest
+from app.agent.digest_agent import DigestAgent, DigestOutput, digest_cache_key
 from app.database.repository import Repository
 
 logging.basicConfig(
@@ -28,19 +29,30 @@ def process_digests(limit: Optional[int] = None) -> dict:
     logger.info(f"Starting digest processing for {total} articles")
     
     for idx, article in enumerate(articles, 1):
+        article_title = article["title"][:60] + "..." if len(article["title"]) > 60 else article["title"]
+        logger.info(f"[{idx}/{total}] Queued {article['type']}: {article_title} (ID: {article['id']})")
+
+    # Reuse digests for inputs that were already summarised
+    cache_keys = [
+        digest_cache_key(article["title"], article["content"], article["type"])
+        for article in articles
+    ]
+    try:
+        cached = repo.get_cached_digests(cache_keys)
+    except Exception as e:
+        # the cache is an optimisation; treat an unreadable cache as all misses
+        repo.session.rollback()
+        logger.warning(f"Digest cache unavailable, generating all digests: {e}")
+        cached = {}
+    misses = [idx for idx, key in enumerate(cache_keys) if key not in cached]
+    logger.info(f"Digest cache: {total - len(misses)} hits, {len(misses)} misses")
+
+    def save(idx: int, digest_result: Optional[DigestOutput]) -> bool:
+        article = articles[idx]
         article_type = article["type"]
         article_id = article["id"]
-        article_title = article["title"][:60] + "..." if len(article["title"]) > 60 else article["title"]
-        
-        logger.info(f"[{idx}/{total}] Processing {article_type}: {article_title} (ID: {article_id})")
-        
+
         try:
-            digest_result = agent.generate_digest(
-                title=article["title"],
-                content=article["content"],
-                article_type=article_type
-            )
-            
             if digest_result:
                 repo.create_digest(
                     article_type=article_type,
@@ -48,16 +60,41 @@ def process_digests(limit: Optional[int] = None) -> dict:
                     url=article["url"],
                     title=digest_result.title,
                     summary=digest_result.summary,
-                    published_at=article.get("published_at")
+                    published_at=article.get("published_at"),
+                    tokens=tokenize_digest(digest_result.title, digest_result.summary)
                 )
-                processed += 1
                 logger.info(f"✓ Successfully created digest for {article_type} {article_id}")
-            else:
-                failed += 1
-                logger.warning(f"✗ Failed to generate digest for {article_type} {article_id}")
+                return True
+            logger.warning(f"✗ Failed to generate digest for {article_type} {article_id}")
         except Exception as e:
-            failed += 1
+            repo.session.rollback()
             logger.error(f"✗ Error processing {article_type} {article_id}: {e}")
+        return False
+
+    for idx, key in enumerate(cache_keys):
+        if key in cached:
+            if save(idx, DigestOutput(**cached[key])):
+                processed += 1
+            else:
+                failed += 1
+
+    # Persist each batch on this thread as soon as it finishes, so a crash
+    # mid-run keeps everything generated so far
+    for start, batch_results in agent.generate_many([
+        (articles[idx]["title"], articles[idx]["content"], articles[idx]["type"])
+        for idx in misses
+    ]):
+        for idx, digest_result in zip(misses[start:start + len(batch_results)], batch_results):
+            if digest_result:
+                try:
+                    repo.cache_digest(cache_keys[idx], digest_result.title, digest_result.summary)
+                except Exception as e:
+                    repo.session.rollback()
+                    logger.warning(f"Could not cache digest for {articles[idx]['type']} {articles[idx]['id']}: {e}")
+            if save(idx, digest_result):
+                processed += 1
+            else:
+                failed += 1
     
     logger.info(f"Processing complete: {processed} processed, {failed} failed out of {total} total")
     
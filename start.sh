@@ -1,6 +1,6 @@
 #!/bin/bash
 # Initialize database tables
-python -c "from app.database.create_tables import *; print('✓ Database tables created')"
+python -c "from app.database.create_tables import ensure_schema; ensure_schema(); print('✓ Database tables created')"
 
 # Run the main pipeline
 python main.py